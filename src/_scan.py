@@ -0,0 +1,25 @@
+# _scan.py - device-side filesystem walk for the host uploader.
+# Lives at /app/_scan.py so tools/upload_to_pico.py can import it instead of
+# shipping (and re-compiling) the walk source over USB on every invocation.
+import os
+
+def _walk(d):
+    try:
+        for e in os.ilistdir(d):
+            path = d.rstrip('/') + '/' + e[0] if d != '/' else '/' + e[0]
+            # ilistdir always reports the mode; print files as they're found
+            if (e[1] & 0x4000) != 0:
+                _walk(path)
+            else:
+                print(path)
+    except OSError:
+        pass
+
+def scan(root, extra=()):
+    _walk(root)
+    for n in extra:
+        try:
+            os.stat(n)
+            print(n)
+        except OSError:
+            pass
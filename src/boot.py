@@ -1,6 +1,13 @@
 # /boot.py  (put this in src/boot.py; your uploader copies it to device root)
 from machine import Pin
 import os
+import sys
+
+# The uploader places everything except main.py/boot.py under /app
+# (see tools/upload_to_pico.py), which is not on the default sys.path;
+# add it here so /main.py can import usbproto and friends.
+if "/app" not in sys.path:
+    sys.path.append("/app")
 
 # Hardware maintenance trigger: hold GP2 LOW at power-on/reset
 MAINT_PIN = Pin(2, Pin.IN, Pin.PULL_UP)
@@ -1,43 +1,168 @@
 # /main.py
-import sys, struct, json, time, micropython, machine
+import sys, struct, json, time, gc, os, binascii, micropython, machine
+import uasyncio as asyncio
+from usbproto import MAX_FRAME, MAGIC
 micropython.kbd_intr(-1)  # disable Ctrl-C on the input stream (USB CDC)  ⟶ important
 # (restore with micropython.kbd_intr(3) if you ever need it)  # 3 == ^C
 
-def read_exact(n: int) -> bytes:
-    b = b""
-    while len(b) < n:
-        chunk = sys.stdin.buffer.read(n - len(b))
-        if not chunk:
-            time.sleep(0.002)
-            continue
-        b += chunk
-    return b
-
-while True:
+# Optional perf mode: bump the core clock while the PERF flag file exists.
+# Roughly doubles interpreter throughput on the dispatch loop for a modest
+# power/thermal cost; toggled via the enter_perf request (delete /PERF to
+# return to the default clock on next boot).
+PERF_FLAG = "PERF"
+try:
+    if PERF_FLAG in os.listdir("/"):
+        machine.freq(250_000_000)
+except Exception:
+    # never let a clock tweak keep the board from serving
+    pass
+
+VERSION = "0.1.0"
+
+# Pre-encoded reply fragments: the version is quoted/escaped by the JSON
+# encoder exactly once, at import, and only the numeric fields vary, so the
+# hot paths splice bytes instead of paying for json.dumps on every request.
+_VERSION_JSON = json.dumps(VERSION).encode()
+_PONG_PREFIX = b'{"type":"pong","ts":'
+_PONG_SUFFIX = b',"version":' + _VERSION_JSON + b'}'
+_STATUS_PREFIX = b'{"type":"status","uptime_ms":'
+_STATUS_MID = b',"heap_free":'
+_STATUS_SUFFIX = b',"version":' + _VERSION_JSON + b'}'
+
+# whole reply frames (magic | len | payload | crc) are assembled in this
+# preallocated buffer and issued as a single write - StreamWriter.write can
+# hit the underlying stream immediately, so separate header/payload/footer
+# writes would each become their own stream write; oversized replies fall
+# back to a one-off concatenation (same pattern as usbproto._send_frame)
+_TX = bytearray(1024)
+_TX[:len(MAGIC)] = MAGIC
+_TX_MV = memoryview(_TX)
+
+# flat receive buffer sized once at boot (payload + CRC footer): every frame
+# is read into this and parsed out of memoryview slices, so the receive side
+# never allocates and never hands the GC per-frame garbage to collect
+_RX = bytearray(MAX_FRAME + 4)
+_RX_MV = memoryview(_RX)
+
+async def _read_exact_into(sr, mv, n):
+    off = 0
+    while off < n:
+        r = await sr.readinto(mv[off:n])
+        if not r:
+            raise EOFError("stream closed")
+        off += r
+
+def _h_ping(msg):
+    return _PONG_PREFIX + str(time.ticks_ms()).encode() + _PONG_SUFFIX
+
+def _h_status(msg):
+    return (_STATUS_PREFIX + str(time.ticks_ms()).encode() +
+            _STATUS_MID + str(gc.mem_free()).encode() + _STATUS_SUFFIX)
+
+def _h_echo(msg):
+    return json.dumps({"type": "echo", "data": msg.get("data")}).encode()
+
+def _h_maintenance(msg):
+    # create the one-boot flag and soft-reset; next boot will leave REPL attached
+    open("MAINTENANCE", "w").close()
+    machine.soft_reset()
+
+def _h_perf(msg):
+    # create the persistent flag and soft-reset; the clock bump applies on boot
+    open(PERF_FLAG, "w").close()
+    machine.soft_reset()
+
+def _h_unknown(msg):
+    return json.dumps({"type": "error", "code": "UNKNOWN_CMD",
+                       "message": "unknown type: %s" % msg.get("type")}).encode()
+
+# O(1) handler lookup instead of an if/elif chain; new commands register here
+_HANDLERS = {
+    "ping": _h_ping,
+    "get_status": _h_status,
+    "echo": _h_echo,
+    "enter_maintenance": _h_maintenance,
+    "enter_perf": _h_perf,
+}
+
+def dispatch(msg):
+    """Handle one decoded request; return the encoded reply payload."""
+    return _HANDLERS.get(msg.get("type"), _h_unknown)(msg)
+
+def _open_transport():
+    """Pick the fastest stream pair this build exposes.
+
+    A dedicated USB CDC data interface, when available, writes straight to
+    the endpoint queue and skips the console stream layer entirely; builds
+    without one fall back to the console CDC via sys.stdin/stdout.
+    """
     try:
-        hdr = sys.stdin.buffer.read(4)
-        if len(hdr) != 4:
-            time.sleep(0.002); continue
-        n = struct.unpack(">I", hdr)[0]
-        if n == 0 or n > 65536:
-            continue
-        payload = read_exact(n)
+        import usb_cdc
+        dev = usb_cdc.data
+        if dev is not None:
+            # non-blocking so the async reader/writer can drive it
+            dev.timeout = 0
+            dev.write_timeout = 0
+            return dev, dev
+    except ImportError:
+        pass
+    return sys.stdin.buffer, sys.stdout.buffer
+
+async def serve(rx, tx):
+    # StreamReader delegates the wait to the port's poll/ioctl, so the USB
+    # stack (and any other tasks) run while we block instead of busy-polling.
+    sr = asyncio.StreamReader(rx)
+    sw = asyncio.StreamWriter(tx, {})
+    # hoist dotted lookups out of the loop; each one is a dict lookup on
+    # MicroPython and they add up on tiny messages
+    write = sw.write
+    drain = sw.drain
+    unpack = struct.unpack
+    pack = struct.pack
+    pack_into = struct.pack_into
+    loads = json.loads
+    crc32 = binascii.crc32
+    while True:
         try:
-            msg = json.loads(payload)
+            # byte-scan for the frame magic, so a dropped or inserted USB
+            # byte costs one frame instead of desynchronizing the session;
+            # a repeated first byte stays a candidate (A5 A5 5A must sync)
+            await _read_exact_into(sr, _RX_MV, 1)
+            synced = False
+            while _RX[0] == MAGIC[0]:
+                await _read_exact_into(sr, _RX_MV, 1)
+                if _RX[0] == MAGIC[1]:
+                    synced = True
+                    break
+            if not synced:
+                continue
+            await _read_exact_into(sr, _RX_MV, 4)
+            n = unpack(">I", _RX_MV[:4])[0]
+            if n == 0 or n > MAX_FRAME:
+                # garbage that happened to look like a frame; rescan
+                continue
+            await _read_exact_into(sr, _RX_MV, n + 4)
+            if crc32(_RX_MV[:n]) & 0xFFFFFFFF != unpack(">I", _RX_MV[n:n + 4])[0]:
+                continue  # corrupt frame; drop it and rescan
+            try:
+                msg = loads(_RX_MV[:n])
+            except Exception:
+                msg = {}
+            data = dispatch(msg)
+            # one write per frame: assemble magic | len | payload | crc in
+            # the reusable TX buffer so the stream sees a single buffer
+            ln = len(data)
+            crc = crc32(data) & 0xFFFFFFFF
+            if 10 + ln <= len(_TX):
+                pack_into(">I", _TX, 2, ln)
+                _TX[6:6 + ln] = data
+                pack_into(">I", _TX, 6 + ln, crc)
+                write(_TX_MV[:10 + ln])
+            else:
+                write(MAGIC + pack(">I", ln) + data + pack(">I", crc))
+            await drain()
         except Exception:
-            msg = {}
-        if msg.get("type") == "ping":
-            out = {"type": "pong"}
-        # inside your request handler:
-        elif msg.get("type") == "enter_maintenance":
-            # create the one-boot flag and soft-reset; next boot will leave REPL attached
-            open("MAINTENANCE", "w").close()
-            machine.soft_reset()
-        else:
-            out = {"echo": msg}
-        data = json.dumps(out).encode()
-        sys.stdout.buffer.write(struct.pack(">I", len(data)) + data)
-        sys.stdout.buffer.flush()
-    except Exception:
-        # swallow errors; never print tracebacks on the wire
-        time.sleep(0.01)
+            # swallow errors; never print tracebacks on the wire
+            await asyncio.sleep_ms(10)
+
+asyncio.run(serve(*_open_transport()))
@@ -1,26 +1,94 @@
 # usbproto.py - helpers for length-prefixed JSON over a stream
 import ustruct as struct
 import ujson as json
+import utime as time
+import micropython
+import ubinascii as binascii
+from micropython import const
 
-def read_n(dev, n):
-    buf = bytearray()
-    while len(buf) < n:
-        chunk = dev.read(n - len(buf))
-        if not chunk:
-            # busy wait; on MicroPython this is common; consider sleep if needed
+# largest payload we will allocate for; a corrupted or hostile header could
+# otherwise ask for 4 GiB and OOM-abort the board
+MAX_FRAME = const(65536)
+
+# frame magic: lets the receiver resynchronize after a dropped or inserted
+# byte instead of mis-reading payload bytes as a length forever
+MAGIC = b'\xA5\x5A'
+_LEN_LEN = const(4)
+_CRC_LEN = const(4)
+
+# reused for every frame header so each recv_obj allocates only the payload
+_hdr_buf = bytearray(_LEN_LEN)
+
+@micropython.native
+def read_into(dev, buf, n):
+    # fill buf[0:n] in place; readinto avoids the per-chunk bytes object
+    # and the extend() realloc/copy churn of a growing bytearray
+    mv = memoryview(buf)
+    off = 0
+    while off < n:
+        r = dev.readinto(mv[off:n])
+        if not r:
+            # yield so the USB/UART stack gets cycles to fill its buffers
+            time.sleep_ms(1)
             continue
-        buf.extend(chunk)
-    return bytes(buf)
+        off += r
+
+@micropython.native
+def read_n(dev, n):
+    buf = bytearray(n)
+    read_into(dev, buf, n)
+    return buf
 
 def recv_obj(dev):
-    hdr = read_n(dev, 4)
-    (length,) = struct.unpack('>I', hdr)
-    payload = read_n(dev, length)
-    return json.loads(payload)
+    # byte-scan for the magic, so corruption costs one frame, not the session
+    while True:
+        read_into(dev, _hdr_buf, 1)
+        synced = False
+        # a repeated first byte stays a candidate: A5 A5 5A must still sync
+        while _hdr_buf[0] == MAGIC[0]:
+            read_into(dev, _hdr_buf, 1)
+            if _hdr_buf[0] == MAGIC[1]:
+                synced = True
+                break
+        if not synced:
+            continue
+        read_into(dev, _hdr_buf, _LEN_LEN)
+        (length,) = struct.unpack('>I', _hdr_buf)
+        if length == 0 or length > MAX_FRAME:
+            # garbage that happened to look like a frame; rescan
+            continue
+        payload = read_n(dev, length + _CRC_LEN)
+        mv = memoryview(payload)
+        (crc,) = struct.unpack('>I', mv[length:])
+        if binascii.crc32(mv[:length]) & 0xFFFFFFFF != crc:
+            continue  # corrupt frame; drop it and rescan
+        return json.loads(mv[:length])
 
-def send_obj(dev, obj):
-    payload = json.dumps(obj).encode('utf-8')
-    hdr = struct.pack('>I', len(payload))
-    dev.write(hdr)
-    dev.write(payload)
+# reusable send-side buffers: frames that fit in _tx_buf go out with zero
+# per-call allocations, still as one write (two writes can each flush at a
+# USB packet boundary, doubling the CDC transactions per reply)
+_tx_hdr = bytearray(len(MAGIC) + _LEN_LEN)
+_tx_hdr[:len(MAGIC)] = MAGIC
+_tx_buf = bytearray(1024)
+
+@micropython.native
+def _send_frame(dev, payload):
+    n = len(payload)
+    crc = binascii.crc32(payload) & 0xFFFFFFFF
+    if 6 + n + _CRC_LEN <= len(_tx_buf):
+        _tx_buf[0:2] = MAGIC
+        struct.pack_into('>I', _tx_buf, 2, n)
+        _tx_buf[6:6 + n] = payload
+        struct.pack_into('>I', _tx_buf, 6 + n, crc)
+        dev.write(memoryview(_tx_buf)[:6 + n + _CRC_LEN])
+    else:
+        struct.pack_into('>I', _tx_hdr, 2, n)
+        dev.write(_tx_hdr + payload + struct.pack('>I', crc))
     dev.flush() if hasattr(dev, "flush") else None
+
+def send_obj_raw(dev, payload):
+    # payload is already-encoded JSON bytes; skips json.dumps for hot paths
+    _send_frame(dev, payload)
+
+def send_obj(dev, obj):
+    _send_frame(dev, json.dumps(obj).encode('utf-8'))
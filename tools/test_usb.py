@@ -5,30 +5,31 @@ Simple USB ping→pong test for the Pico protocol (length-prefixed JSON).
 Usage examples:
   python tools/test_usb.py --port COM3
   python tools/test_usb.py --auto --count 5 --interval 0.2
-  python tools/test_usb.py --port COM3 --json '{"type":"echo","msg":"hi"}'
+  python tools/test_usb.py --port COM3 --json '{"type":"echo","data":"hi"}'
 """
 
-import argparse, json, struct, sys, time
+import argparse, binascii, json, struct, sys, time
 import serial
 from serial.tools import list_ports
 
 RPI_VID = 0x2E8A  # Raspberry Pi
+MAGIC = b"\xA5\x5A"  # frame sync marker, see docs/protocol.md
 
 def find_port() -> str | None:
     cands = [p.device for p in list_ports.comports() if getattr(p, "vid", None) == RPI_VID]
     return cands[0] if len(cands) == 1 else None
 
-def read_exact(ser: serial.Serial, n: int, timeout_s: float) -> bytes:
-    """Read exactly n bytes or raise TimeoutError."""
-    buf = bytearray()
+def read_exact_into(ser: serial.Serial, buf: bytearray, n: int, timeout_s: float) -> None:
+    """Fill buf[:n] in place or raise TimeoutError."""
+    mv = memoryview(buf)
+    off = 0
     deadline = time.time() + timeout_s
-    while len(buf) < n:
-        chunk = ser.read(n - len(buf))
-        if chunk:
-            buf.extend(chunk)
+    while off < n:
+        r = ser.readinto(mv[off:n])
+        if r:
+            off += r
         elif time.time() > deadline:
-            raise TimeoutError(f"read_exact timeout: got {len(buf)}/{n} bytes")
-    return bytes(buf)
+            raise TimeoutError(f"read_exact timeout: got {off}/{n} bytes")
 
 def main():
     ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
@@ -52,7 +53,14 @@ def main():
         ap.error("please provide --port or --auto")
 
     payload = args.payload.encode("utf-8")
-    frame = struct.pack(">I", len(payload)) + payload  # 4-byte big-endian length + JSON
+    # magic + 4-byte big-endian length + JSON + CRC32 of the JSON
+    frame = (MAGIC + struct.pack(">I", len(payload)) + payload
+             + struct.pack(">I", binascii.crc32(payload) & 0xFFFFFFFF))
+
+    # reused across pings so --count N benchmarks measure the Pico, not host GC
+    sync_buf = bytearray(1)
+    hdr_buf = bytearray(4)
+    body_buf = bytearray(65536 + 4)
 
     # Open cleanly each time: assert DTR/RTS, brief settle, flush input.
     with serial.Serial(port, args.baud, timeout=args.timeout, write_timeout=args.timeout) as ser:
@@ -65,14 +73,28 @@ def main():
             # send
             ser.write(frame)
             ser.flush()
+            # sync to the frame magic (tolerates stray bytes after resets)
+            read_exact_into(ser, sync_buf, 1, args.timeout)
+            while True:
+                if sync_buf[0] == MAGIC[0]:
+                    read_exact_into(ser, sync_buf, 1, args.timeout)
+                    if sync_buf[0] == MAGIC[1]:
+                        break
+                else:
+                    read_exact_into(ser, sync_buf, 1, args.timeout)
             # recv header
-            hdr = read_exact(ser, 4, args.timeout)
-            n = struct.unpack(">I", hdr)[0]
+            read_exact_into(ser, hdr_buf, 4, args.timeout)
+            n = struct.unpack_from(">I", hdr_buf)[0]
             if n == 0 or n > 65536:
-                print(f"[{i}] bad length: {n} (header={hdr!r})", file=sys.stderr)
+                print(f"[{i}] bad length: {n} (header={bytes(hdr_buf)!r})", file=sys.stderr)
+                sys.exit(3)
+            # recv payload + CRC footer
+            read_exact_into(ser, body_buf, n + 4, args.timeout)
+            body = bytes(memoryview(body_buf)[:n])
+            crc = struct.unpack_from(">I", body_buf, n)[0]
+            if binascii.crc32(body) & 0xFFFFFFFF != crc:
+                print(f"[{i}] bad crc: frame {crc:#010x}", file=sys.stderr)
                 sys.exit(3)
-            # recv payload
-            body = read_exact(ser, n, args.timeout)
             try:
                 msg = json.loads(body)
             except Exception:
@@ -19,7 +19,8 @@ Examples
   python tools/upload_to_pico.py --list           # list candidate devices
 """
 from __future__ import annotations
-import argparse, os, sys, subprocess, textwrap
+import argparse, binascii, os, sys, subprocess, textwrap
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Dict, List, Tuple
 
@@ -41,6 +42,21 @@ def mp_run(port: str, *args: str) -> None:
     print(">", " ".join(cmd))
     subprocess.check_call(cmd)
 
+def mp_run_batch(port: str, ops: List[List[str]]) -> None:
+    """
+    Run several mpremote commands in one invocation using '+' chaining,
+    so the port is opened and negotiated once instead of once per file.
+    """
+    if not ops:
+        return
+    cmd = mp_cmd(port)
+    for i, op in enumerate(ops):
+        if i:
+            cmd.append("+")
+        cmd.extend(op)
+    print(">", " ".join(cmd))
+    subprocess.check_call(cmd)
+
 def mp_out(port: str, *args: str) -> str:
     cmd = mp_cmd(port, *args)
     print(">", " ".join(cmd))
@@ -103,77 +119,114 @@ def build_manifest(src_root: Path) -> Dict[str, Path]:
     return manifest
 
 # ---------- remote listing & cleaning ----------
+# Preferred path: the walk ships once as src/_scan.py (-> /app/_scan.py with
+# the rest of the manifest), so each listing only sends this three-liner.
+SCAN_CALL = r"""
+import sys
+sys.path.insert(0, %(APP_ROOT)r)
+import _scan
+_scan.scan(%(APP_ROOT)r, %(root_candidates)r)
+"""
+
+# Fallback for first-time uploads, before the helper exists on the device.
 LIST_SCRIPT = r"""
 import os
 def walk(d):
     try:
-        lst = []
         for e in os.ilistdir(d):
             name = e[0]
             path = d.rstrip('/') + '/' + name if d != '/' else '/' + name
-            try:
-                is_dir = (e[1] & 0x4000) != 0  # best-effort DIR bit
-            except:
-                try:
-                    is_dir = (os.stat(path)[0] & 0x4000) != 0
-                except:
-                    is_dir = False
-            if is_dir:
-                lst += walk(path)
+            # ilistdir always reports the mode on VfsLfs2/VfsFat; trusting it
+            # avoids an os.stat (= extra flash hit) per entry
+            if (e[1] & 0x4000) != 0:
+                walk(path)
             else:
-                lst.append(path)
-        return lst
+                # print as we go so the host can consume while flash is read
+                print(path)
     except Exception:
-        return []
-paths = []
+        pass
 # Project subtree:
-paths += walk(%(APP_ROOT)r)
+walk(%(APP_ROOT)r)
 # Root files we might manage (only if present in local manifest):
 for n in (%(root_candidates)r):
     try:
         os.stat(n)
-        paths.append(n)
+        print(n)
     except:
         pass
-print("\n".join(paths))
 """
 
 def list_device_files(port: str, managed_root_files: List[str]) -> List[str]:
-    code = LIST_SCRIPT % {"APP_ROOT": APP_ROOT, "root_candidates": tuple(managed_root_files)}
-    out = mp_out(port, "exec", code)
+    params = {"APP_ROOT": APP_ROOT, "root_candidates": tuple(managed_root_files)}
+    try:
+        out = mp_out(port, "exec", SCAN_CALL % params)
+    except subprocess.CalledProcessError:
+        # helper not uploaded yet (fresh board); send the walk inline once
+        out = mp_out(port, "exec", LIST_SCRIPT % params)
     return [line.strip() for line in out.splitlines() if line.strip()]
 
-def ensure_parent_dirs(port: str, dests: list[str]) -> None:
+HASH_SCRIPT = r"""
+import binascii
+for p in %(paths)r:
+    try:
+        crc = 0
+        with open(p, 'rb') as f:
+            buf = f.read(512)
+            while buf:
+                crc = binascii.crc32(buf, crc)
+                buf = f.read(512)
+        print(p, crc, sep='\t')
+    except OSError:
+        pass
+"""
+
+def remote_hashes(port: str, paths: List[str]) -> Dict[str, int]:
+    """CRC32 of each device file in paths; missing files are simply absent."""
+    code = HASH_SCRIPT % {"paths": tuple(paths)}
+    out = mp_out(port, "exec", code)
+    hashes: Dict[str, int] = {}
+    for line in out.splitlines():
+        path, _, crc = line.strip().rpartition("\t")
+        if path and crc.isdigit():
+            hashes[path] = int(crc)
+    return hashes
+
+def local_crc32(p: Path) -> int:
+    return binascii.crc32(p.read_bytes()) & 0xFFFFFFFF
+
+MKDIRS_SCRIPT = r"""
+import os
+for d in %(dirs)r:
+    cur = ''
+    for part in d.strip('/').split('/'):
+        cur += '/' + part
+        try:
+            os.mkdir(cur)
+        except OSError:
+            pass
+"""
+
+def mkdir_ops(dests: list[str]) -> List[List[str]]:
     """
-    Ensure all parent directories for the given device paths exist.
-    dests are device paths like '/app/foo/bar.py' (no leading ':').
+    Build ops ensuring all parent directories for the given device paths
+    exist. dests are device paths like '/app/foo/bar.py' (no leading ':').
+    Done as one 'exec' so "already exists" is handled on-device instead of
+    as a failed mkdir that would abort a chained invocation.
     """
-    import subprocess
-
-    # collect unique parent dirs
     dirs = set()
     for dp in dests:
         dp = dp.lstrip(":")  # be tolerant if caller passed ':'
         parent = "/".join(dp.split("/")[:-1])
         if parent and parent != "/":
             dirs.add(parent)
+    if not dirs:
+        return []
+    code = MKDIRS_SCRIPT % {"dirs": tuple(sorted(dirs, key=lambda s: s.count("/")))}
+    return [["exec", code]]
 
-    # make each directory level-by-level; ignore "already exists" errors
-    for d in sorted(dirs, key=lambda s: s.count("/")):
-        parts = [p for p in d.strip("/").split("/") if p]
-        cur = ""
-        for part in parts:
-            cur = (cur + "/" + part) if cur else "/" + part
-            try:
-                mp_run(port, "mkdir", f":{cur}")
-            except subprocess.CalledProcessError:
-                # ok if it already exists
-                pass
-
-def remove_remote_paths(port: str, paths: list[str]) -> None:
-    for p in sorted(paths, key=lambda s: s.count("/"), reverse=True):
-        rp = p if p.startswith(":") else f":{p}"
-        mp_run(port, "rm", rp)
+def remove_ops(paths: list[str]) -> List[List[str]]:
+    return [["rm", p if p.startswith(":") else f":{p}"]
+            for p in sorted(paths, key=lambda s: s.count("/"), reverse=True)]
 
 # ---------- main ----------
 def main():
@@ -222,8 +275,26 @@ def main():
     else:
         to_remove = []
 
+    # Skip files whose content already matches the device (CRC32 compare);
+    # if the device can't be queried, fall back to copying everything.
+    # Local hashing runs on a small thread pool so it overlaps the device
+    # query; device I/O itself stays serialized (only one process may own
+    # the port).
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        local_futs = {dest: pool.submit(local_crc32, src)
+                      for dest, src in manifest.items()}
+        try:
+            remote = remote_hashes(port, sorted(manifest.keys()))
+        except subprocess.CalledProcessError:
+            remote = {}
+        to_copy = {dest: src for dest, src in manifest.items()
+                   if remote.get(dest) != local_futs[dest].result()}
+
     for dest, src in manifest.items():
-        plan_lines.append(f"COPY {src} -> :{dest}")
+        if dest in to_copy:
+            plan_lines.append(f"COPY {src} -> :{dest}")
+        else:
+            plan_lines.append(f"SKIP {src} == :{dest}")
 
     if not args.yes:
         print("\nPlan:")
@@ -242,22 +313,23 @@ def main():
             print(line)
         sys.exit(0)
 
-    # Apply
+    # Apply: chain every operation into one mpremote session instead of a
+    # subprocess + serial open/negotiate/close per file
+    ops: List[List[str]] = []
     if args.clean and to_remove:
-        remove_remote_paths(port, [f":{p.lstrip(':')}" if not p.startswith(":") else p for p in to_remove])
+        ops += remove_ops(to_remove)
 
     # Make sure parent dirs exist on device for all destinations
-    ensure_parent_dirs(port, list(manifest.keys()))
+    ops += mkdir_ops(list(to_copy.keys()))
 
-    # Copy files
-    for dest, src in manifest.items():
-        mp_run(port, "cp", str(src), f":{dest}")
+    # Copy only what changed
+    for dest, src in to_copy.items():
+        ops.append(["cp", str(src), f":{dest}"])
 
     if args.reset:
-        try:
-            mp_run(port, "soft-reset")
-        except subprocess.CalledProcessError:
-            pass
+        ops.append(["soft-reset"])
+
+    mp_run_batch(port, ops)
 
     print("Upload complete to", port)
 